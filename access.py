@@ -0,0 +1,139 @@
+"""صلاحيات الوصول وتحديد معدل الطلبات لكل مستخدم ولكل إجراء"""
+import logging
+import re
+import time
+from collections import Counter, deque
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger("siiragg.access")
+
+_TRAILING_ID = re.compile(r"_\d+$")
+
+
+def parse_user_list(value):
+    """"@ali, sara,12345" -> frozenset({"ali", "sara", "12345"}) دون عناصر فارغة"""
+    return frozenset(item.strip().lstrip("@") for item in value.split(",") if item.strip().lstrip("@"))
+
+
+def parse_rate(value):
+    """"30/60" -> (30, 60.0): عدد الطلبات المسموح بها خلال نافذة بالثواني"""
+    limit, window = value.split("/")
+    return int(limit), float(window)
+
+
+def scale_rate(rate, scale):
+    """تسريع الزمن scale مرة يعني نافذة أقصر بنفس النسبة (لإعادة تشغيل التحديثات المسجلة)"""
+    limit, window = rate
+    return limit, window / scale
+
+
+def user_in(user, users):
+    """العنصر في القائمة إما اسم مستخدم أو معرف رقمي"""
+    return user.username in users or str(user.id) in users
+
+
+def action_of(event, raw_state):
+    """اسم الإجراء: بيانات الزر دون رقم المنشور، أو الأمر، أو حالة FSM للرسائل"""
+    if isinstance(event, CallbackQuery):
+        return _TRAILING_ID.sub("", event.data or "")
+    if event.text and event.text.startswith("/"):
+        return event.text.split()[0]
+    return raw_state or "message"
+
+
+class SlidingWindowLimiter:
+    """نافذة منزلقة لكل مفتاح: لا يُسمح بأكثر من limit طلب خلال window ثانية"""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._calls = 0
+
+    def allow(self, key):
+        """هل يُسمح بطلب جديد الآن؟ دون احتسابه"""
+        now = time.monotonic()
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            self._prune(now)
+
+        hits = self._hits.get(key)
+        if not hits:
+            return True
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        return len(hits) < self.limit
+
+    def record(self, key):
+        self._hits.setdefault(key, deque()).append(time.monotonic())
+
+    def _prune(self, now):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+
+class AccessMiddleware(BaseMiddleware):
+    """وسيط خارجي على الرسائل والأزرار: يرفض غير المصرح لهم، ويحد معدل كل مستخدم وكل إجراء قبل أي استعلام لقاعدة البيانات"""
+
+    def __init__(self, is_allowed, per_user=None, per_action=None, max_in_flight=None):
+        """الحدود الغائبة (None) معطلة"""
+        self.is_allowed = is_allowed
+        self.per_user = SlidingWindowLimiter(*per_user) if per_user else None
+        self.per_action = SlidingWindowLimiter(*per_action) if per_action else None
+        self.max_in_flight = max_in_flight
+        self.throttled = Counter()  # (المستخدم، الإجراء) -> عدد الطلبات المرفوضة
+        self._in_flight = Counter()
+        self._notified = set()  # من أُبلغ برفض رسالته منذ آخر طلب مقبول
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        action = action_of(event, data.get("raw_state"))
+        if not self.is_allowed(user):
+            # /start يرد برسالة "البوت خاص"، وما عداه يُتجاهل دون أي عمل
+            if action == "/start":
+                return await handler(event, data)
+            if isinstance(event, CallbackQuery):
+                await event.answer("❌ البوت خاص بفريق سراج فقط", show_alert=True)
+            return None
+
+        # الطلب يُحتسب على الحدين معًا فقط إذا قبله كلاهما، فالمرفوض بحد الإجراء لا يستهلك حد المستخدم
+        if (
+            (self.max_in_flight is not None and self._in_flight[user.id] >= self.max_in_flight)
+            or (self.per_action is not None and not self.per_action.allow((user.id, action)))
+            or (self.per_user is not None and not self.per_user.allow(user.id))
+        ):
+            return await self._reject(user, action, event)
+        if self.per_action is not None:
+            self.per_action.record((user.id, action))
+        if self.per_user is not None:
+            self.per_user.record(user.id)
+
+        self._notified.discard(user.id)
+        self._in_flight[user.id] += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight[user.id] -= 1
+            if not self._in_flight[user.id]:
+                del self._in_flight[user.id]
+
+    async def _reject(self, user, action, event):
+        label = f"@{user.username}" if user.username else str(user.id)
+        if not self.throttled[(label, action)]:
+            logger.warning("Throttling %s on %s", label, action)
+        self.throttled[(label, action)] += 1
+
+        # الرد بلا أي استعلام لقاعدة البيانات؛ الرسائل (ومنها مدخلات النماذج) تُبلغ مرة واحدة لكل موجة رفض
+        if isinstance(event, CallbackQuery):
+            await event.answer("⏳ طلبات كثيرة، انتظر قليلًا ثم أعد المحاولة")
+        elif user.id not in self._notified:
+            self._notified.add(user.id)
+            await event.answer("⏳ طلبات كثيرة، انتظر قليلًا ثم أعد إرسال رسالتك")
+        return None
@@ -0,0 +1,44 @@
+"""دورة حياة البوت: إشارة الجاهزية، وتتبع التحديثات الجارية لتصريفها قبل الإيقاف"""
+import asyncio
+import os
+from contextlib import suppress
+
+from aiogram import BaseMiddleware
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """وسيط خارجي يحصي التحديثات قيد المعالجة حتى ينتظرها الإيقاف"""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(self, handler, event, data):
+        self.count += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.count -= 1
+            if not self.count:
+                self._idle.set()
+
+    async def drain(self, timeout):
+        """انتظار انتهاء التحديثات الجارية حتى المهلة؛ يعيد عدد ما بقي منها"""
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        return self.count
+
+
+def mark_ready(path):
+    """إنشاء ملف الجاهزية (لفحوص الجاهزية في بيئة التشغيل)"""
+    if path:
+        with open(path, "w") as f:
+            f.write(str(os.getpid()))
+
+
+def mark_not_ready(path):
+    if path:
+        with suppress(FileNotFoundError):
+            os.remove(path)
@@ -0,0 +1,167 @@
+"""تسجيل التحديثات الواردة بصيغة JSONL مع إخفاء البيانات الشخصية، لإعادة تشغيلها لاحقًا عبر replay.py"""
+import hashlib
+import json
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.aiohttp import AiohttpSession
+
+# الحقول التي تحمل هوية المستخدم أو المحادثة
+# (بما فيها المرسل الأصلي للرسائل المعاد توجيهها)
+_IDENTITY_PARENTS = (
+    "from", "from_user", "chat", "user", "sender_chat", "sender_user", "forward_from", "forward_from_chat",
+    "via_bot", "new_chat_members", "left_chat_member", "contact",
+)
+_NAME_KEYS = ("first_name", "last_name", "title", "phone_number", "email", "vcard")
+# أسماء وتواقيع تظهر خارج كائنات الهوية (مرسل مخفي، توقيع القناة...)
+_FREE_NAME_KEYS = ("sender_user_name", "forward_sender_name", "forward_signature", "author_signature")
+_FILE_KEYS = ("file_id", "file_unique_id")
+_CONTENT_KEYS = ("text", "caption")
+
+
+@dataclass
+class UpdateTrace:
+    """ما جرى أثناء معالجة تحديث واحد: المعالج، واستدعاءات API الصادرة، وحالة FSM بعده"""
+    ts: float
+    handler: str = None
+    handler_ms: float = None
+    duration_ms: float = None
+    calls: list = field(default_factory=list)
+    state: str = None
+
+
+_current_trace: ContextVar = ContextVar("update_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def pseudonymize(value, salt):
+    """اسم مستعار ثابت لنفس القيمة ونفس المفتاح"""
+    digest = hashlib.sha256(f"{salt}:{value}".encode()).hexdigest()
+    return f"u{digest[:10]}"
+
+
+def pseudonymize_id(value, salt):
+    digest = hashlib.sha256(f"{salt}:id:{value}".encode()).hexdigest()
+    return int(digest[:12], 16)
+
+
+def redact_text(value):
+    """الأوامر مثل /start و /skip تحدد المعالج فنُبقي كلمة الأمر وحدها، وما بعدها يُخفى بنفس طوله"""
+    if not value.startswith("/"):
+        return "x" * len(value)
+    command = value.split()[0]
+    rest = value[len(command):]
+    return command + (" " + "x" * (len(rest) - 1) if rest else "")
+
+
+def redact_update(data, salt, parent=None):
+    """إخفاء المعرفات والأسماء والمحتوى مع الإبقاء على الأوامر وبيانات الأزرار وشكل التحديث"""
+    if isinstance(data, list):
+        return [redact_update(item, salt, parent) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    redacted = {}
+    for key, value in data.items():
+        if key == "username" and isinstance(value, str):
+            redacted[key] = pseudonymize(value, salt)
+        elif key == "id" and parent in _IDENTITY_PARENTS and isinstance(value, int):
+            redacted[key] = pseudonymize_id(value, salt)
+        elif key == "user_id" and isinstance(value, int):
+            redacted[key] = pseudonymize_id(value, salt)
+        elif (key in _NAME_KEYS and parent in _IDENTITY_PARENTS) or key in _FREE_NAME_KEYS or key == "url":
+            redacted[key] = "redacted"
+        elif key in _FILE_KEYS and isinstance(value, str):
+            redacted[key] = pseudonymize(value, salt)
+        elif key in _CONTENT_KEYS and isinstance(value, str):
+            redacted[key] = redact_text(value)
+        else:
+            redacted[key] = redact_update(value, salt, key)
+    return redacted
+
+
+class RecordingSession(AiohttpSession):
+    """جلسة aiohttp عادية تسجل اسم كل استدعاء API ضمن تتبع التحديث الحالي"""
+
+    async def make_request(self, bot, method, timeout=None):
+        trace = current_trace()
+        if trace is not None:
+            trace.calls.append(method.__api_method__)
+        return await super().make_request(bot, method, timeout)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """وسيط داخلي يسجل اسم المعالج الذي التقط الحدث وزمن تنفيذه"""
+
+    async def __call__(self, handler, event, data):
+        trace = current_trace()
+        if trace is None:
+            return await handler(event, data)
+
+        trace.handler = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            trace.handler_ms = (time.perf_counter() - started) * 1000
+
+
+class UpdateTracer(BaseMiddleware):
+    """وسيط خارجي ينشئ تتبعًا لكل تحديث ويسلمه إلى on_trace بعد انتهاء المعالجة"""
+
+    async def __call__(self, handler, event, data):
+        trace = UpdateTrace(ts=time.time())
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            trace.duration_ms = (time.perf_counter() - started) * 1000
+            _current_trace.reset(token)
+            state = data.get("state")
+            if state is not None:
+                trace.state = await state.get_state()
+            self.on_trace(event, trace)
+
+    def on_trace(self, event, trace):
+        pass
+
+
+class UpdateRecorder(UpdateTracer):
+    """يكتب كل تحديث (بعد إخفاء البيانات الشخصية) مع تتبعه سطرًا في ملف JSONL"""
+
+    def __init__(self, path, salt=""):
+        self.salt = salt
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def on_trace(self, event, trace):
+        record = {
+            "ts": trace.ts,
+            "update": redact_update(event.model_dump(mode="json", exclude_none=True, by_alias=True), self.salt),
+            "handler": trace.handler,
+            "handler_ms": trace.handler_ms,
+            "duration_ms": trace.duration_ms,
+            "calls": trace.calls,
+            "state": trace.state,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+def install_tracing(dp, tracer):
+    dp.update.outer_middleware(tracer)
+    dp.message.middleware(HandlerTimingMiddleware())
+    dp.callback_query.middleware(HandlerTimingMiddleware())
+    return tracer
+
+
+def install_recorder(dp, path, salt=""):
+    """تفعيل التسجيل على الموزّع؛ يجب أن تكون جلسة البوت RecordingSession لتسجيل الاستدعاءات الصادرة"""
+    return install_tracing(dp, UpdateRecorder(path, salt))
@@ -0,0 +1,270 @@
+"""إعادة تشغيل التحديثات المسجلة (recorder.py) على الموزّع المبني في siiragg_bot دون اتصال بتيليجرام
+
+الاستخدام:
+    python replay.py updates.jsonl --speed 10 --database-url postgresql://localhost/siiragg_replay --reset
+
+- الاستدعاءات الصادرة تذهب إلى واجهة Bot API وهمية تسجّلها فقط.
+- المخزن قاعدة بيانات محلية مستقلة؛ لا يُسمح باستخدام DATABASE_URL الخاصة بالإنتاج.
+- يحافظ على التوقيت النسبي (1x أو 10x أو max) وعلى ترتيب التحديثات داخل كل محادثة.
+- الأزرار المسجلة تشير إلى أرقام منشورات الإنتاج؛ استخدم --seed لتعبئة القاعدة المحلية، وإلا
+  يُفصل في التقرير الاختلاف الناتج عن منشورات غير موجودة.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from itertools import count
+from typing import get_args
+
+import asyncpg
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.types import Chat, Message, Update, User
+
+import siiragg_bot
+from recorder import UpdateTracer, current_trace, install_tracing, pseudonymize, pseudonymize_id
+
+REPLAY_TOKEN = "123456:replay"
+MAX_DIVERGENCE_EXAMPLES = 10
+_POST_ID = re.compile(r"_(\d+)$")
+
+
+class FakeBotSession(BaseSession):
+    """واجهة Bot API وهمية: تسجل اسم كل استدعاء وتعيد نتيجة مقبولة دون أي اتصال"""
+
+    def __init__(self):
+        super().__init__()
+        self._message_ids = count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        trace = current_trace()
+        if trace is not None:
+            trace.calls.append(method.__api_method__)
+
+        returning = get_args(method.__returning__) or (method.__returning__,)
+        if Message in returning:
+            chat_id = getattr(method, "chat_id", None)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+            ).as_(bot)
+        if User in returning:
+            return User(id=bot.id, is_bot=True, first_name="replay", username="replay_bot").as_(bot)
+        if bool in returning:
+            return True
+        return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        return
+        yield
+
+    async def close(self):
+        pass
+
+
+class ReplayTracer(UpdateTracer):
+    def __init__(self):
+        self.traces = {}
+
+    def on_trace(self, event, trace):
+        self.traces[event.update_id] = trace
+
+
+def pseudonymize_users(users, salt):
+    """قوائم الصلاحيات بنفس الأسماء المستعارة المستخدمة في التسجيل (أسماء المستخدمين والمعرفات الرقمية)"""
+    return frozenset(str(pseudonymize_id(int(u), salt)) if u.isdigit() else pseudonymize(u, salt) for u in users)
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def referenced_posts(records):
+    """update_id -> رقم المنشور الذي يشير إليه الزر (show_post_N و approve_N ...)"""
+    posts = {}
+    for record in records:
+        callback = record["update"].get("callback_query")
+        match = _POST_ID.search(callback.get("data") or "") if callback else None
+        if match:
+            posts[record["update"]["update_id"]] = int(match.group(1))
+    return posts
+
+
+async def find_missing_posts(pool, posts):
+    """التحديثات التي تشير إلى منشور غير موجود في القاعدة المحلية عند بدء الإعادة"""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch('SELECT id FROM posts WHERE id = ANY($1::int[])', sorted(set(posts.values())))
+    existing = {row['id'] for row in rows}
+    return {update_id: post_id for update_id, post_id in posts.items() if post_id not in existing}
+
+
+def chat_key(update):
+    """مفتاح الترتيب: تحديثات المحادثة نفسها تُعالج بالتسلسل، والمحادثات المختلفة بالتوازي"""
+    message = update.get("message") or (update.get("callback_query") or {}).get("message")
+    if message:
+        return message["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback:
+        return callback["from"]["id"]
+    return f"update_{update['update_id']}"
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def feed(dp, bot, record, previous, errors):
+    """خطأ أي تحديث (حتى سجل تالف) يُسجل في errors ولا يوقف باقي تحديثات المحادثة"""
+    if previous is not None:
+        await asyncio.wait([previous])
+    try:
+        update = Update.model_validate(record["update"], context={"bot": bot})
+        await dp.feed_update(bot, update)
+    except Exception as e:
+        errors.append((record["update"].get("update_id"), repr(e)))
+
+
+async def dispatch_all(dp, bot, records, speed):
+    """جدولة التحديثات بحسب توقيتها المسجل مقسومًا على السرعة (speed=None تعني أقصى سرعة)"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_ts = records[0]["ts"]
+    chains = {}
+    errors = []
+
+    for record in records:
+        if speed:
+            delay = (record["ts"] - first_ts) / speed - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        key = chat_key(record["update"])
+        chains[key] = asyncio.create_task(feed(dp, bot, record, chains.get(key), errors))
+
+    await asyncio.gather(*chains.values())
+    return errors
+
+
+def build_report(records, traces, errors, elapsed, speed, missing_posts):
+    latencies = {}
+    call_divergence = []
+    state_divergence = []
+
+    for record in records:
+        update_id = record["update"]["update_id"]
+        trace = traces.get(update_id)
+        if trace is None:
+            continue
+        if trace.handler is not None:
+            latencies.setdefault(trace.handler, []).append(trace.handler_ms)
+        if trace.calls != record["calls"]:
+            call_divergence.append((update_id, record.get("handler"), record["calls"], trace.calls))
+        if trace.state != record.get("state"):
+            state_divergence.append((update_id, record.get("handler"), record.get("state"), trace.state))
+
+    speed_label = f"{speed:g}x" if speed else "max"
+    lines = [
+        f"replayed {len(traces)}/{len(records)} updates in {elapsed:.2f}s (speed {speed_label}), errors: {len(errors)}",
+        "",
+        f"{'handler':<32}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)",
+    ]
+    for name, values in sorted(latencies.items(), key=lambda item: -percentile(item[1], 95)):
+        lines.append(
+            f"{name:<32}{len(values):>7}"
+            f"{percentile(values, 50):>10.2f}{percentile(values, 95):>10.2f}"
+            f"{percentile(values, 99):>10.2f}{max(values):>10.2f}"
+        )
+
+    lines += ["", f"outbound call divergence: {len(call_divergence)} updates"]
+    missing = [update_id for update_id, *_ in call_divergence if update_id in missing_posts]
+    if missing:
+        lines.append(f"  of which {len(missing)} reference posts missing from the scratch database (use --seed)")
+    for update_id, handler, recorded, replayed in call_divergence[:MAX_DIVERGENCE_EXAMPLES]:
+        note = f" [missing post {missing_posts[update_id]}]" if update_id in missing_posts else ""
+        lines.append(f"  update {update_id} ({handler}): recorded {recorded} replayed {replayed}{note}")
+
+    lines += ["", f"FSM state divergence: {len(state_divergence)} updates"]
+    for update_id, handler, recorded, replayed in state_divergence[:MAX_DIVERGENCE_EXAMPLES]:
+        lines.append(f"  update {update_id} ({handler}): recorded {recorded} replayed {replayed}")
+
+    for update_id, error in errors[:MAX_DIVERGENCE_EXAMPLES]:
+        lines.append(f"  error in update {update_id}: {error}")
+
+    return "\n".join(lines)
+
+
+async def replay(path, speed, database_url, reset, salt, seed=None):
+    records = load_records(path)
+    if not records:
+        return "no updates to replay"
+
+    # المستخدمون في التسجيل بأسماء مستعارة، فنحوّل قوائم الصلاحيات بنفس المفتاح
+    siiragg_bot.ALLOWED_USERS = pseudonymize_users(siiragg_bot.ALLOWED_USERS, salt)
+    siiragg_bot.REVIEWERS = pseudonymize_users(siiragg_bot.REVIEWERS, salt)
+
+    pool = await asyncpg.create_pool(database_url)
+    try:
+        await siiragg_bot.setup_database(pool)
+        if reset:
+            async with pool.acquire() as conn:
+                await conn.execute("TRUNCATE posts RESTART IDENTITY")
+        if seed:
+            with open(seed, encoding="utf-8") as f:
+                seed_sql = f.read()
+            async with pool.acquire() as conn:
+                await conn.execute(seed_sql)
+        missing_posts = await find_missing_posts(pool, referenced_posts(records))
+
+        bot = Bot(token=REPLAY_TOKEN, session=FakeBotSession(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        # حدود المعدل تقيس الزمن الحقيقي، فتُضغط نوافذها بنفس سرعة الإعادة (وتُعطل عند max)
+        dp = siiragg_bot.build_dispatcher(pool, rate_limit_scale=speed)
+        tracer = install_tracing(dp, ReplayTracer())
+
+        started = time.perf_counter()
+        errors = await dispatch_all(dp, bot, records, speed)
+        elapsed = time.perf_counter() - started
+    finally:
+        await pool.close()
+
+    return build_report(records, tracer.traces, errors, elapsed, speed, missing_posts)
+
+
+def parse_speed(value):
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded bot updates against a fake Bot API and a local database.")
+    parser.add_argument("path", help="JSONL file written with RECORD_UPDATES_PATH")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, ... or 'max' (default: 1)")
+    parser.add_argument("--database-url", default=os.getenv("REPLAY_DATABASE_URL"), help="local scratch database (default: $REPLAY_DATABASE_URL)")
+    parser.add_argument("--reset", action="store_true", help="truncate the posts table before replaying")
+    parser.add_argument("--seed", help="SQL file run after --reset to load posts the recording refers to")
+    parser.add_argument("--salt", default=os.getenv("RECORD_SALT", ""), help="salt used while recording (default: $RECORD_SALT)")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or REPLAY_DATABASE_URL is required")
+    if args.database_url == siiragg_bot.DATABASE_URL:
+        parser.error("refusing to replay against DATABASE_URL; use a local scratch database")
+
+    print(asyncio.run(replay(args.path, args.speed, args.database_url, args.reset, args.salt, args.seed)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
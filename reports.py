@@ -0,0 +1,153 @@
+"""تقرير المراجعة الدوري: المنشورات المتأخرة وزمن المراجعة، مع تخزين مؤقت وجدولة في مهمة خلفية واحدة"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, time as day_time, timedelta
+
+logger = logging.getLogger("siiragg.reports")
+
+# عمر المنشور المنتظر يُحسب من إنشائه، والمحتاج للتعديل من تاريخ طلب التعديل
+_POST_AGE_SINCE = "COALESCE(CASE WHEN status = 'needs_edit' THEN reviewed_at END, created_at)"
+
+
+@dataclass
+class Report:
+    statuses: dict
+    stale: dict
+    stale_by_author: list
+    reviewed: int
+    turnaround: list  # الوسيط و90% و99% بالثواني، أو None
+    stale_days: int
+    window_days: int
+    generated_at: datetime = field(default_factory=datetime.now)
+
+
+async def fetch_report(pool, stale_days, window_days):
+    async with pool.acquire() as conn:
+        status_rows = await conn.fetch(f'''
+            SELECT status, count(*) AS total,
+                   count(*) FILTER (WHERE {_POST_AGE_SINCE} < NOW() - make_interval(days => $1)) AS stale
+            FROM posts GROUP BY status
+        ''', stale_days)
+        author_rows = await conn.fetch(f'''
+            SELECT username, count(*) AS stale
+            FROM posts
+            WHERE status IN ('pending', 'needs_edit') AND {_POST_AGE_SINCE} < NOW() - make_interval(days => $1)
+            GROUP BY username ORDER BY stale DESC, username LIMIT 10
+        ''', stale_days)
+        turnaround = await conn.fetchrow('''
+            SELECT count(*) AS reviewed,
+                   percentile_cont(ARRAY[0.5, 0.9, 0.99])
+                       WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM reviewed_at - created_at)) AS seconds
+            FROM posts
+            WHERE status <> 'pending' AND reviewed_at >= NOW() - make_interval(days => $1)
+        ''', window_days)
+
+    return Report(
+        statuses={row['status']: row['total'] for row in status_rows},
+        stale={row['status']: row['stale'] for row in status_rows if row['stale']},
+        stale_by_author=[(row['username'], row['stale']) for row in author_rows],
+        reviewed=turnaround['reviewed'],
+        turnaround=turnaround['seconds'],
+        stale_days=stale_days,
+        window_days=window_days,
+    )
+
+
+def _hours(seconds):
+    return f"{seconds / 3600:.1f} س"
+
+
+def render_digest(report):
+    msg = "📊 <b>تقرير المراجعة والتدقيق</b>\n\n"
+    msg += f"⏳ بانتظار المراجعة: {report.statuses.get('pending', 0)}"
+    msg += f" (منها {report.stale.get('pending', 0)} أقدم من {report.stale_days} أيام)\n"
+    msg += f"📝 تحتاج تعديل: {report.statuses.get('needs_edit', 0)}"
+    msg += f" (منها {report.stale.get('needs_edit', 0)} أقدم من {report.stale_days} أيام)\n"
+    msg += f"✅ معتمدة: {report.statuses.get('approved', 0)}   ❌ مرفوضة: {report.statuses.get('rejected', 0)}\n"
+
+    if report.stale_by_author:
+        msg += "\n👤 <b>المنشورات المتأخرة حسب الكاتب:</b>\n"
+        msg += "\n".join(f"• @{username}: {count}" for username, count in report.stale_by_author)
+        msg += "\n"
+
+    if report.turnaround:
+        p50, p90, p99 = report.turnaround
+        msg += f"\n⏱️ <b>زمن المراجعة</b> (آخر {report.window_days} يومًا، {report.reviewed} منشور):\n"
+        msg += f"الوسيط {_hours(p50)} · 90% {_hours(p90)} · 99% {_hours(p99)}\n"
+
+    msg += f"\n🕒 <i>حُدّث في: {report.generated_at.strftime('%Y-%m-%d %H:%M')}</i>"
+    return msg
+
+
+def parse_schedule(value):
+    """"08:00,20:00" -> [(8, 0), (20, 0)]؛ الأوقات غير الصالحة مثل 24:00 ترفع ValueError عند بدء التشغيل"""
+    times = []
+    for item in value.split(","):
+        if item.strip():
+            hour, minute = item.strip().split(":")
+            run = day_time(int(hour), int(minute))
+            times.append((run.hour, run.minute))
+    return times
+
+
+def next_run(now, times):
+    today = [now.replace(hour=hour, minute=minute, second=0, microsecond=0) for hour, minute in times]
+    return min(run for run in today + [run + timedelta(days=1) for run in today] if run > now)
+
+
+class ReportEngine:
+    """يبني التقرير عند الطلب ويخزنه مؤقتًا، ويرسله للمراجعين في المواعيد المحددة"""
+
+    def __init__(self, pool, stale_days=3, window_days=30, cache_minutes=60, schedule=(), chat_ids=()):
+        self.pool = pool
+        self.stale_days = stale_days
+        self.window_days = window_days
+        self.cache_seconds = cache_minutes * 60
+        self.schedule = list(schedule)
+        self.chat_ids = list(chat_ids)
+        self._digest = None
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def digest(self, force=False):
+        """نص التقرير؛ الطلبات خلال نافذة التخزين لا تلمس قاعدة البيانات"""
+        async with self._lock:
+            if force or self._digest is None or time.monotonic() - self._built_at > self.cache_seconds:
+                report = await fetch_report(self.pool, self.stale_days, self.window_days)
+                self._digest = render_digest(report)
+                self._built_at = time.monotonic()
+            return self._digest
+
+    def start(self, bot):
+        if self.schedule and self.chat_ids and self._task is None:
+            self._task = asyncio.create_task(self._run(bot), name="review-digest")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                # فشل المهمة لا يمنع بقية خطوات الإيقاف (انتظار الطلبات وإغلاق القاعدة)
+                logger.exception("Review digest task failed")
+            self._task = None
+
+    async def _run(self, bot):
+        while True:
+            run_at = next_run(datetime.now(), self.schedule)
+            await asyncio.sleep((run_at - datetime.now()).total_seconds())
+            try:
+                digest = await self.digest(force=True)
+            except Exception:
+                logger.exception("Failed to build review digest")
+                continue
+            for chat_id in self.chat_ids:
+                try:
+                    await bot.send_message(chat_id, digest)
+                except Exception:
+                    logger.exception("Failed to send review digest to %s", chat_id)
@@ -1,8 +1,9 @@
 import os
+import time
 import asyncio
+import logging
 import asyncpg
-from datetime import datetime
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, Router, types, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.enums import ParseMode
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -11,11 +12,33 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.client.default import DefaultBotProperties
+from recorder import RecordingSession, install_recorder
+from lifecycle import InFlightMiddleware, mark_ready, mark_not_ready
+from reports import ReportEngine, parse_schedule
+from access import AccessMiddleware, parse_rate, parse_user_list, scale_rate, user_in
+
+logger = logging.getLogger("siiragg")
 
 TOKEN = os.getenv("BOT_TOKEN")
-ALLOWED_USERS = os.getenv("ALLOWED_USERS", "").split(",")
-REVIEWERS = os.getenv("REVIEWERS", "").split(",")  # المراجعين والمشايخ
+# أسماء مستخدمين أو معرفات رقمية مفصولة بفواصل
+ALLOWED_USERS = parse_user_list(os.getenv("ALLOWED_USERS", ""))
+REVIEWERS = parse_user_list(os.getenv("REVIEWERS", ""))  # المراجعين والمشايخ
 DATABASE_URL = os.getenv("DATABASE_URL")
+RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH")  # ملف JSONL لتسجيل التحديثات
+RECORD_SALT = os.getenv("RECORD_SALT", "")  # مفتاح إخفاء المعرفات وأسماء المستخدمين
+REVIEW_LEASE_MINUTES = int(os.getenv("REVIEW_LEASE_MINUTES", "15"))  # مدة حجز المنشور للمراجع
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))  # مهلة إنهاء المعالجات الجارية عند الإيقاف
+READY_FILE = os.getenv("READY_FILE")  # يُنشأ عند الجاهزية ويُحذف عند بدء الإيقاف
+REPORT_STALE_DAYS = int(os.getenv("REPORT_STALE_DAYS", "3"))  # المنشور المتأخر: أقدم من هذا العدد من الأيام
+REPORT_WINDOW_DAYS = int(os.getenv("REPORT_WINDOW_DAYS", "30"))  # نافذة حساب زمن المراجعة
+REPORT_CACHE_MINUTES = int(os.getenv("REPORT_CACHE_MINUTES", "60"))
+REPORT_SCHEDULE = parse_schedule(os.getenv("REPORT_SCHEDULE", "08:00"))  # مواعيد إرسال التقرير يوميًا
+RATE_LIMIT_PER_USER = parse_rate(os.getenv("RATE_LIMIT_PER_USER", "40/60"))  # طلبات/ثوانٍ لكل مستخدم
+RATE_LIMIT_PER_ACTION = parse_rate(os.getenv("RATE_LIMIT_PER_ACTION", "10/30"))  # طلبات/ثوانٍ لكل مستخدم وإجراء
+MAX_IN_FLIGHT_PER_USER = int(os.getenv("MAX_IN_FLIGHT_PER_USER", "3"))  # حتى لا يستهلك مستخدم واحد اتصالات قاعدة البيانات
+REPORT_CHAT_IDS = [int(chat_id) for chat_id in os.getenv("REPORT_CHAT_IDS", "").split(",") if chat_id.strip()]  # محادثات المراجعين
 
 class PostForm(StatesGroup):
     waiting_for_title = State()
@@ -66,6 +89,15 @@ def confirm_delete_kb(post_id):
         ]
     )
 
+def review_queue_kb():
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="📥 المنشور التالي للمراجعة", callback_data="review_next")],
+            [InlineKeyboardButton(text="📋 كل المنشورات", callback_data="review_all")],
+            [InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]
+        ]
+    )
+
 def review_post_kb(post_id):
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -113,12 +145,12 @@ def view_categories_kb():
     )
 
 async def create_pool():
-    return await asyncpg.create_pool(DATABASE_URL)
+    # المهلات تمنع تعليق الإقلاع أو المعالجات إن تعطلت قاعدة البيانات
+    return await asyncpg.create_pool(DATABASE_URL, timeout=DB_CONNECT_TIMEOUT, command_timeout=DB_COMMAND_TIMEOUT)
 
 async def setup_database(pool):
-    """إنشاء الجداول وإضافة الأعمدة الجديدة إن لم تكن موجودة"""
+    """إنشاء الجداول وإضافة الأعمدة الجديدة إن لم تكن موجودة (في رحلة واحدة إلى قاعدة البيانات)"""
     async with pool.acquire() as conn:
-        # إنشاء جدول المنشورات إن لم يكن موجوداً
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS posts (
                 id SERIAL PRIMARY KEY,
@@ -127,29 +159,30 @@ async def setup_database(pool):
                 photo_file_id TEXT,
                 username TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            );
+
+            -- أعمدة المراجعة، وأعمدة حجز المنشور لمراجع واحد (طابور المراجعة)
+            ALTER TABLE posts
+                ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'pending',
+                ADD COLUMN IF NOT EXISTS review_note TEXT,
+                ADD COLUMN IF NOT EXISTS reviewed_by TEXT,
+                ADD COLUMN IF NOT EXISTS reviewed_at TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+                ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+
+            -- فهرس جزئي على المنشورات المنتظرة فقط حتى يبقى سحب المنشور التالي قراءة صف واحد
+            CREATE INDEX IF NOT EXISTS posts_pending_queue_idx ON posts (id) WHERE status = 'pending';
+            CREATE INDEX IF NOT EXISTS posts_claimed_by_idx ON posts (claimed_by) WHERE status = 'pending' AND claimed_by IS NOT NULL;
         ''')
-        
-        # إضافة أعمدة المراجعة إن لم تكن موجودة
-        try:
-            await conn.execute('ALTER TABLE posts ADD COLUMN status TEXT DEFAULT \'pending\'')
-        except:
-            pass  # العمود موجود بالفعل
-            
-        try:
-            await conn.execute('ALTER TABLE posts ADD COLUMN review_note TEXT')
-        except:
-            pass  # العمود موجود بالفعل
-            
-        try:
-            await conn.execute('ALTER TABLE posts ADD COLUMN reviewed_by TEXT')
-        except:
-            pass  # العمود موجود بالفعل
-            
-        try:
-            await conn.execute('ALTER TABLE posts ADD COLUMN reviewed_at TIMESTAMP')
-        except:
-            pass  # العمود موجود بالفعل
+
+async def warm_up_database():
+    pool = await create_pool()
+    try:
+        await setup_database(pool)
+    except BaseException:
+        await pool.close()
+        raise
+    return pool
 
 async def insert_post(pool, post):
     async with pool.acquire() as conn:
@@ -172,7 +205,8 @@ async def get_posts_for_review(pool):
 
 async def get_post_by_id(pool, post_id):
     async with pool.acquire() as conn:
-        return await conn.fetchrow('SELECT * FROM posts WHERE id=$1', int(post_id))
+        # claim_active يُحسب بساعة قاعدة البيانات نفسها التي كُتب بها claimed_until
+        return await conn.fetchrow('SELECT *, claimed_until > NOW() AS claim_active FROM posts WHERE id=$1', int(post_id))
 
 async def delete_post(pool, post_id):
     async with pool.acquire() as conn:
@@ -183,12 +217,87 @@ async def update_post(pool, post_id, field, value):
         await conn.execute(f'UPDATE posts SET {field}=$1 WHERE id=$2', value, post_id)
 
 async def update_post_review_status(pool, post_id, status, reviewer_username, note=None):
+    # القرار يحرر حجز المنشور
     async with pool.acquire() as conn:
         await conn.execute('''
             UPDATE posts 
-            SET status=$1, reviewed_by=$2, reviewed_at=$3, review_note=$4 
-            WHERE id=$5
-        ''', status, reviewer_username, datetime.now(), note, post_id)
+            SET status=$1, reviewed_by=$2, reviewed_at=NOW(), review_note=$3, claimed_by=NULL, claimed_until=NULL 
+            WHERE id=$4
+        ''', status, reviewer_username, note, post_id)
+
+async def claim_next_post(pool, reviewer_username, lease_minutes=REVIEW_LEASE_MINUTES):
+    """حجز أقدم منشور بانتظار المراجعة للمراجع، أو تجديد حجزه الحالي إن وُجد"""
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # طلبات المراجع نفسه تُنفذ واحدًا تلو الآخر، فالضغطتان السريعتان لا تحجزان منشورين
+            await conn.execute('SELECT pg_advisory_xact_lock(hashtext($1))', reviewer_username)
+            post = await conn.fetchrow('''
+                UPDATE posts
+                SET claimed_until = NOW() + make_interval(mins => $2)
+                WHERE status = 'pending' AND claimed_by = $1 AND claimed_until > NOW()
+                RETURNING *
+            ''', reviewer_username, lease_minutes)
+            if post:
+                return post
+
+            # SKIP LOCKED: المراجعون المتزامنون يحصل كل منهم على منشور مختلف دون انتظار
+            return await conn.fetchrow('''
+                UPDATE posts
+                SET claimed_by = $1, claimed_until = NOW() + make_interval(mins => $2)
+                WHERE id = (
+                    SELECT id FROM posts
+                    WHERE status = 'pending' AND (claimed_until IS NULL OR claimed_until <= NOW())
+                    ORDER BY id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+            ''', reviewer_username, lease_minutes)
+
+async def get_queue_position(pool, post_id):
+    """ترتيب المنشور بين المنتظرين (مسح للفهرس الجزئي حتى المنشور فقط، لا لكل الطابور)"""
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            "SELECT count(*) + 1 FROM posts WHERE status = 'pending' AND id < $1", post_id
+        )
+
+async def get_claimed_post(pool, reviewer_username):
+    """المنشور المحجوز حاليًا للمراجع مع ترتيبه في الطابور، أو None"""
+    async with pool.acquire() as conn:
+        return await conn.fetchrow('''
+            SELECT p.id, p.title,
+                   (SELECT count(*) + 1 FROM posts WHERE status = 'pending' AND id < p.id) AS position
+            FROM posts p
+            WHERE p.status = 'pending' AND p.claimed_by = $1 AND p.claimed_until > NOW()
+            LIMIT 1
+        ''', reviewer_username)
+
+def review_post_text(post):
+    msg = f"🧾 <b>مراجعة المنشور:</b>\n\n<b>{post['title']}</b>\n\n{post['text']}"
+    
+    if post['status'] != 'pending':
+        status_text = {
+            'approved': '✅ معتمد',
+            'rejected': '❌ مرفوض', 
+            'needs_edit': '📝 يحتاج تعديل'
+        }.get(post['status'], '')
+        msg += f"\n\n<i>الحالة الحالية: {status_text}</i>"
+        if post['reviewed_by']:
+            msg += f"\n<i>راجعه: {post['reviewed_by']}</i>"
+        if post['review_note']:
+            msg += f"\n<i>الملاحظة: {post['review_note']}</i>"
+    return msg
+
+def user_key(user):
+    # هوية ثابتة لمن ليس له اسم مستخدم (المسموح لهم بالمعرف الرقمي): تُحفظ في username و claimed_by و reviewed_by
+    return user.username or str(user.id)
+
+def user_is_reviewer(user):
+    return user_in(user, REVIEWERS)
+
+def user_is_allowed(user):
+    # المراجعون من الفريق حتى لو لم يُذكروا في ALLOWED_USERS
+    return user_in(user, ALLOWED_USERS) or user_is_reviewer(user)
 
 # دالة مساعدة لإرسال أو تعديل الرسائل بشكل صحيح
 async def send_or_edit_message(callback_or_message, text, reply_markup=None, is_photo_message=False):
@@ -210,558 +319,692 @@ async def send_or_edit_message(callback_or_message, text, reply_markup=None, is_
         else:
             await callback_or_message.answer(text, reply_markup=reply_markup)
 
-async def main():
-    bot = Bot(token=TOKEN, session=AiohttpSession(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(storage=MemoryStorage())
-    pool = await create_pool()
+# الموجّهات تُبنى مرة واحدة عند تحميل الوحدة، وتصل المعالجات إلى قاعدة البيانات عبر المعامل pool
+main_router = Router(name="main")
+posts_router = Router(name="posts")
+review_router = Router(name="review")
+
+@main_router.message(F.text.startswith("/start"))
+async def welcome(message: Message):
+    if not user_is_allowed(message.from_user):
+        await message.answer("❌ البوت خاص بفريق سراج فقط، تواصل مع الإدارة للتفعيل.")
+        return
+    
+    is_reviewer = user_is_reviewer(message.from_user)
     
-    # إعداد قاعدة البيانات
-    await setup_database(pool)
-
-    @dp.message(F.text.startswith("/start"))
-    async def welcome(message: Message):
-        if message.from_user.username not in ALLOWED_USERS:
-            await message.answer("❌ البوت خاص بفريق سراج فقط، تواصل مع الإدارة للتفعيل.")
-            return
+    # Send spiritual reminder first
+    await message.answer("🕊️ قبل أن تبدأ، تذكّر:\n\nاتقِ الله في عملك، وأخلص نيتك لله، ولا تكتب إلا ما صح عن النبي ﷺ، فإن الله مطلع على ما في قلبك ويعلم ما تقول.")
+    
+    # Then send the main welcome message with menu
+    welcome_text = "السلام عليكم ورحمة الله وبركاته 🌿\n\nأهلاً وسهلاً بك في <b>مخزن سراج</b> هنا يمكنك إدارة منشوراتك:\n\n🔹 رفع منشور جديد\n🔹 عرض المنشورات\n🔹 تعديل المنشورات\n🔹 حذف المنشورات"
+    
+    if is_reviewer:
+        welcome_text += "\n🔹 مراجعة وتدقيق المحتوى"
         
-        is_reviewer = message.from_user.username in REVIEWERS
+    welcome_text += "\n\nاختر ما يناسبك من القائمة أدناه 👇"
+    
+    await message.answer(welcome_text, reply_markup=main_menu_kb(is_reviewer))
+
+# تقرير المراجعة عند الطلب (من الذاكرة المؤقتة ما دام حديثًا)
+@main_router.message(F.text.startswith("/report"))
+async def review_report(message: Message, reports: ReportEngine):
+    if not user_is_reviewer(message.from_user):
+        await message.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط")
+        return
+
+    await message.answer(await reports.digest())
+
+# من تم تقييد طلباتهم منذ تشغيل البوت
+@main_router.message(F.text.startswith("/throttled"))
+async def throttled_users(message: Message, access: AccessMiddleware):
+    if not user_is_reviewer(message.from_user):
+        await message.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط")
+        return
+
+    if not access.throttled:
+        await message.answer("✅ لم يتم تقييد أي مستخدم.")
+        return
+
+    lines = [f"• {user} — {action}: {count}" for (user, action), count in access.throttled.most_common(15)]
+    await message.answer("⏳ <b>الطلبات المقيّدة:</b>\n\n" + "\n".join(lines))
+
+@posts_router.callback_query(F.data == "upload")
+async def upload_post(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(PostForm.waiting_for_title)
+    await send_or_edit_message(callback, "✍️ قبل أن تكتب عنوان منشورك، تذكّر أن الله يراك، وأن الكلمة أمانة.\n\nاختر عنوانًا يعبر عن الحق، ويهدي القلوب، ويكون شاهدًا لك لا عليك.\n\nأرسل الآن عنوان المنشور جزاك الله خيرًا:")
+
+@posts_router.message(PostForm.waiting_for_title)
+async def receive_title(message: Message, state: FSMContext):
+    await state.update_data(title=message.text)
+    await state.set_state(PostForm.waiting_for_text)
+    await message.answer("📝 قبل أن تكتب محتوى منشورك، اجعل قلبك حاضرًا، ونيّتك صادقة.\n\nفإن الكلمة قد ترفعك عند الله، أو تهوي بك إن لم تتقِ فيها ربك.\n\nأرسل الآن نص المنشور، نفع الله بك:")
+
+@posts_router.message(PostForm.waiting_for_text)
+async def receive_text(message: Message, state: FSMContext):
+    await state.update_data(text=message.text)
+    await state.set_state(PostForm.waiting_for_image)
+    await message.answer("🖼️ إن كانت الصورة تعين على الخير وتزيد المعنى وضوحًا، فأهلاً بها.\n\nاختر صورة طيبة، خالية من المنكرات، واعلم أن الله لا تخفى عليه نيتك.\n\nأرسل الصورة الآن، أو أرسل /skip لتخطيها:")
+
+@posts_router.message(PostForm.waiting_for_image, F.photo)
+async def receive_image(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    photo_file_id = message.photo[-1].file_id
+    post = {
+        "title": data['title'],
+        "text": data['text'],
+        "photo": photo_file_id,
+        "username": user_key(message.from_user)
+    }
+    await insert_post(pool, post)
+    await message.answer("✅ تم رفع المنشور بنجاح وهو الآن بانتظار المراجعة والتدقيق من المشايخ الكرام. جزاك الله خير.", reply_markup=main_menu_kb(user_is_reviewer(message.from_user)))
+    await state.clear()
+
+@posts_router.message(PostForm.waiting_for_image, F.text == "/skip")
+async def skip_image(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    post = {
+        "title": data['title'],
+        "text": data['text'],
+        "photo": None,
+        "username": user_key(message.from_user)
+    }
+    await insert_post(pool, post)
+    await message.answer("✅ تم رفع المنشور بدون صورة وهو الآن بانتظار المراجعة والتدقيق من المشايخ الكرام. بارك الله فيك.", reply_markup=main_menu_kb(user_is_reviewer(message.from_user)))
+    await state.clear()
+
+@posts_router.callback_query(F.data == "view")
+async def handle_view(callback: CallbackQuery):
+    await send_or_edit_message(callback, "📚 اختر نوع المنشورات التي تريد عرضها:", view_categories_kb())
+
+@posts_router.callback_query(F.data == "view_approved")
+async def view_approved_posts(callback: CallbackQuery, pool: asyncpg.Pool):
+    posts = await get_posts_by_status(pool, 'approved')
+    if not posts:
+        await send_or_edit_message(callback, "❌ لا توجد منشورات مراجعة لعرضها.", back_to_main_kb())
+        return
+    buttons = [[InlineKeyboardButton(text=f"✅ {row['title']}", callback_data=f"show_post_{row['id']}")] for row in posts]
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="view")]])
+    await send_or_edit_message(callback, "📚 المنشورات المراجعة والمعتمدة:", markup)
+
+@posts_router.callback_query(F.data == "view_pending")
+async def view_pending_posts(callback: CallbackQuery, pool: asyncpg.Pool):
+    posts = await get_posts_by_status(pool, 'pending')
+    if not posts:
+        await send_or_edit_message(callback, "❌ لا توجد منشورات بانتظار المراجعة.", back_to_main_kb())
+        return
+    buttons = [[InlineKeyboardButton(text=f"⏳ {row['title']}", callback_data=f"show_post_{row['id']}")] for row in posts]
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="view")]])
+    await send_or_edit_message(callback, "📚 المنشورات بانتظار المراجعة:\n\n📌 لم يتم مراجعة هذه المنشورات بعد، فكن على يقظة قبل استخدامها", markup)
+
+@posts_router.callback_query(F.data.startswith("show_post_"))
+async def show_post(callback: CallbackQuery, pool: asyncpg.Pool):
+    post_id = int(callback.data.split("_")[2])
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        msg = f"<b>{post['title']}</b>\n\n{post['text']}"
         
-        # Send spiritual reminder first
-        await message.answer("🕊️ قبل أن تبدأ، تذكّر:\n\nاتقِ الله في عملك، وأخلص نيتك لله، ولا تكتب إلا ما صح عن النبي ﷺ، فإن الله مطلع على ما في قلبك ويعلم ما تقول.")
+        # إضافة معلومات المراجعة
+        if post['status'] == 'approved':
+            msg += f"\n\n✅ <i>تمت مراجعة هذا المنشور وإقراره من قبل: {post['reviewed_by']}</i>"
+        elif post['status'] == 'needs_edit' and post['review_note']:
+            msg += f"\n\n📝 <i>ملاحظة المراجع المبارك:</i>\n{post['review_note']}"
+        elif post['status'] == 'pending':
+            msg += "\n\n⏳ <i>هذا المنشور بانتظار المراجعة</i>"
         
-        # Then send the main welcome message with menu
-        welcome_text = "السلام عليكم ورحمة الله وبركاته 🌿\n\nأهلاً وسهلاً بك في <b>مخزن سراج</b> هنا يمكنك إدارة منشوراتك:\n\n🔹 رفع منشور جديد\n🔹 عرض المنشورات\n🔹 تعديل المنشورات\n🔹 حذف المنشورات"
+        if post['photo_file_id']:
+            await callback.message.answer_photo(photo=post['photo_file_id'], caption=msg, reply_markup=back_to_main_kb())
+        else:
+            await send_or_edit_message(callback, msg, back_to_main_kb())
+    else:
+        await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
+
+# قسم المراجعة والتدقيق: طابور عمل يحجز فيه كل مراجع منشورًا واحدًا
+@review_router.callback_query(F.data == "review_section")
+async def review_section(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
+        return
+
+    claimed = await get_claimed_post(pool, user_key(callback.from_user))
+    msg = "🧾 طابور المراجعة والتدقيق:\n\n"
+    if claimed:
+        msg += f"🔒 محجوز لك الآن: <b>{claimed['title']}</b>\n"
+        msg += f"📍 موقعه في الطابور: {claimed['position']}\n\n"
+    msg += "اضغط «المنشور التالي» ليُحجز لك أقدم منشور لم يراجعه أحد."
+    await send_or_edit_message(callback, msg, review_queue_kb())
+
+@review_router.callback_query(F.data == "review_next")
+async def review_next(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
+        return
+
+    post = await claim_next_post(pool, user_key(callback.from_user))
+    if not post:
+        await send_or_edit_message(callback, "✅ لا توجد منشورات متاحة للمراجعة حاليًا. جزاك الله خيرًا.", review_queue_kb())
+        return
+
+    position = await get_queue_position(pool, post['id'])
+    msg = review_post_text(post)
+    msg += f"\n\n📍 <i>موقعه في الطابور: {position}</i>"
+    msg += f"\n🔒 <i>محجوز لك لمدة {REVIEW_LEASE_MINUTES} دقيقة</i>"
+
+    if post['photo_file_id']:
+        await callback.message.answer_photo(photo=post['photo_file_id'], caption=msg, reply_markup=review_post_kb(post['id']))
+    else:
+        await send_or_edit_message(callback, msg, review_post_kb(post['id']))
+
+@review_router.callback_query(F.data == "review_all")
+async def review_all(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
+        return
         
-        if is_reviewer:
-            welcome_text += "\n🔹 مراجعة وتدقيق المحتوى"
-            
-        welcome_text += "\n\nاختر ما يناسبك من القائمة أدناه 👇"
+    posts = await get_posts_for_review(pool)
+    if not posts:
+        await send_or_edit_message(callback, "❌ لا توجد منشورات للمراجعة.", back_to_main_kb())
+        return
         
-        await message.answer(welcome_text, reply_markup=main_menu_kb(is_reviewer))
-
-    @dp.callback_query(F.data == "upload")
-    async def upload_post(callback: CallbackQuery, state: FSMContext):
-        await state.set_state(PostForm.waiting_for_title)
-        await send_or_edit_message(callback, "✍️ قبل أن تكتب عنوان منشورك، تذكّر أن الله يراك، وأن الكلمة أمانة.\n\nاختر عنوانًا يعبر عن الحق، ويهدي القلوب، ويكون شاهدًا لك لا عليك.\n\nأرسل الآن عنوان المنشور جزاك الله خيرًا:")
-
-    @dp.message(PostForm.waiting_for_title)
-    async def receive_title(message: Message, state: FSMContext):
-        await state.update_data(title=message.text)
-        await state.set_state(PostForm.waiting_for_text)
-        await message.answer("📝 قبل أن تكتب محتوى منشورك، اجعل قلبك حاضرًا، ونيّتك صادقة.\n\nفإن الكلمة قد ترفعك عند الله، أو تهوي بك إن لم تتقِ فيها ربك.\n\nأرسل الآن نص المنشور، نفع الله بك:")
-
-    @dp.message(PostForm.waiting_for_text)
-    async def receive_text(message: Message, state: FSMContext):
-        await state.update_data(text=message.text)
-        await state.set_state(PostForm.waiting_for_image)
-        await message.answer("🖼️ إن كانت الصورة تعين على الخير وتزيد المعنى وضوحًا، فأهلاً بها.\n\nاختر صورة طيبة، خالية من المنكرات، واعلم أن الله لا تخفى عليه نيتك.\n\nأرسل الصورة الآن، أو أرسل /skip لتخطيها:")
-
-    @dp.message(PostForm.waiting_for_image, F.photo)
-    async def receive_image(message: Message, state: FSMContext):
-        data = await state.get_data()
-        photo_file_id = message.photo[-1].file_id
-        post = {
-            "title": data['title'],
-            "text": data['text'],
-            "photo": photo_file_id,
-            "username": message.from_user.username
-        }
-        await insert_post(pool, post)
-        await message.answer("✅ تم رفع المنشور بنجاح وهو الآن بانتظار المراجعة والتدقيق من المشايخ الكرام. جزاك الله خير.", reply_markup=main_menu_kb(message.from_user.username in REVIEWERS))
-        await state.clear()
-
-    @dp.message(PostForm.waiting_for_image, F.text == "/skip")
-    async def skip_image(message: Message, state: FSMContext):
-        data = await state.get_data()
-        post = {
-            "title": data['title'],
-            "text": data['text'],
-            "photo": None,
-            "username": message.from_user.username
-        }
-        await insert_post(pool, post)
-        await message.answer("✅ تم رفع المنشور بدون صورة وهو الآن بانتظار المراجعة والتدقيق من المشايخ الكرام. بارك الله فيك.", reply_markup=main_menu_kb(message.from_user.username in REVIEWERS))
-        await state.clear()
-
-    @dp.callback_query(F.data == "view")
-    async def handle_view(callback: CallbackQuery):
-        await send_or_edit_message(callback, "📚 اختر نوع المنشورات التي تريد عرضها:", view_categories_kb())
-
-    @dp.callback_query(F.data == "view_approved")
-    async def view_approved_posts(callback: CallbackQuery):
-        posts = await get_posts_by_status(pool, 'approved')
-        if not posts:
-            await send_or_edit_message(callback, "❌ لا توجد منشورات مراجعة لعرضها.", back_to_main_kb())
-            return
-        buttons = [[InlineKeyboardButton(text=f"✅ {row['title']}", callback_data=f"show_post_{row['id']}")] for row in posts]
-        markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="view")]])
-        await send_or_edit_message(callback, "📚 المنشورات المراجعة والمعتمدة:", markup)
-
-    @dp.callback_query(F.data == "view_pending")
-    async def view_pending_posts(callback: CallbackQuery):
-        posts = await get_posts_by_status(pool, 'pending')
-        if not posts:
-            await send_or_edit_message(callback, "❌ لا توجد منشورات بانتظار المراجعة.", back_to_main_kb())
-            return
-        buttons = [[InlineKeyboardButton(text=f"⏳ {row['title']}", callback_data=f"show_post_{row['id']}")] for row in posts]
-        markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="view")]])
-        await send_or_edit_message(callback, "📚 المنشورات بانتظار المراجعة:\n\n📌 لم يتم مراجعة هذه المنشورات بعد، فكن على يقظة قبل استخدامها", markup)
-
-    @dp.callback_query(F.data.startswith("show_post_"))
-    async def show_post(callback: CallbackQuery):
-        post_id = int(callback.data.split("_")[2])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            msg = f"<b>{post['title']}</b>\n\n{post['text']}"
-            
-            # إضافة معلومات المراجعة
-            if post['status'] == 'approved':
-                msg += f"\n\n✅ <i>تمت مراجعة هذا المنشور وإقراره من قبل: {post['reviewed_by']}</i>"
-            elif post['status'] == 'needs_edit' and post['review_note']:
-                msg += f"\n\n📝 <i>ملاحظة المراجع المبارك:</i>\n{post['review_note']}"
-            elif post['status'] == 'pending':
-                msg += "\n\n⏳ <i>هذا المنشور بانتظار المراجعة</i>"
-            
-            if post['photo_file_id']:
-                await callback.message.answer_photo(photo=post['photo_file_id'], caption=msg, reply_markup=back_to_main_kb())
-            else:
-                await send_or_edit_message(callback, msg, back_to_main_kb())
-        else:
-            await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
-
-    # قسم المراجعة والتدقيق
-    @dp.callback_query(F.data == "review_section")
-    async def review_section(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
-            return
-            
-        posts = await get_posts_for_review(pool)
-        if not posts:
-            await send_or_edit_message(callback, "❌ لا توجد منشورات للمراجعة.", back_to_main_kb())
-            return
-            
-        buttons = []
-        for row in posts:
-            status_emoji = {
-                'pending': '⏳',
-                'approved': '✅',
-                'rejected': '❌',
-                'needs_edit': '📝'
-            }.get(row['status'], '⏳')
-            
-            buttons.append([InlineKeyboardButton(
-                text=f"{status_emoji} {row['title']}", 
-                callback_data=f"review_post_{row['id']}"
-            )])
-            
-        markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]])
-        await send_or_edit_message(callback, "🧾 اختر المنشور الذي تريد مراجعته وتدقيقه:\n\n⏳ بانتظار المراجعة\n✅ معتمد\n❌ مرفوض\n📝 يحتاج تعديل", markup)
-
-    @dp.callback_query(F.data.startswith("review_post_"))
-    async def review_post(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[2])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            msg = f"🧾 <b>مراجعة المنشور:</b>\n\n<b>{post['title']}</b>\n\n{post['text']}"
-            
-            if post['status'] != 'pending':
-                status_text = {
-                    'approved': '✅ معتمد',
-                    'rejected': '❌ مرفوض', 
-                    'needs_edit': '📝 يحتاج تعديل'
-                }.get(post['status'], '')
-                msg += f"\n\n<i>الحالة الحالية: {status_text}</i>"
-                if post['reviewed_by']:
-                    msg += f"\n<i>راجعه: {post['reviewed_by']}</i>"
-                if post['review_note']:
-                    msg += f"\n<i>الملاحظة: {post['review_note']}</i>"
-            
-            if post['photo_file_id']:
-                await callback.message.answer_photo(photo=post['photo_file_id'], caption=msg, reply_markup=review_post_kb(post_id))
-            else:
-                await send_or_edit_message(callback, msg, review_post_kb(post_id))
-        else:
-            await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
-
-    # عرض معلومات المراجعة في رسالة منفصلة
-    @dp.callback_query(F.data.startswith("show_review_info_"))
-    async def show_review_info(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[3])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            # تنسيق معلومات المراجعة للنسخ
-            info_msg = f"📋 <b>معلومات مراجعة المنشور #{post_id}</b>\n\n"
-            info_msg += f"📝 <b>العنوان:</b> {post['title']}\n\n"
-            
-            # حالة المنشور
-            status_text = {
-                'pending': '⏳ بانتظار المراجعة',
-                'approved': '✅ معتمد للنشر',
-                'rejected': '❌ مرفوض',
-                'needs_edit': '📝 يحتاج تعديل'
-            }.get(post['status'], 'غير محدد')
-            info_msg += f"🏷️ <b>الحالة:</b> {status_text}\n\n"
-            
-            # معلومات المراجع
-            if post['reviewed_by']:
-                info_msg += f"👤 <b>المراجع:</b> @{post['reviewed_by']}\n\n"
-                
-            if post['reviewed_at']:
-                review_date = post['reviewed_at'].strftime("%Y-%m-%d %H:%M")
-                info_msg += f"📅 <b>تاريخ المراجعة:</b> {review_date}\n\n"
-                
-            # ملاحظة المراجع
-            if post['review_note']:
-                info_msg += f"📝 <b>ملاحظة المراجع:</b>\n{post['review_note']}\n\n"
-                
-            # معلومات الكاتب الأصلي
-            info_msg += f"👤 <b>كاتب المنشور:</b> @{post['username']}\n"
-            
-            if post['created_at']:
-                created_date = post['created_at'].strftime("%Y-%m-%d %H:%M")
-                info_msg += f"📅 <b>تاريخ الإنشاء:</b> {created_date}"
-            
-            # إرسال الرسالة المنفصلة
-            await callback.message.answer(info_msg, reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[[InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")]]
-            ))
+    buttons = []
+    for row in posts:
+        status_emoji = {
+            'pending': '⏳',
+            'approved': '✅',
+            'rejected': '❌',
+            'needs_edit': '📝'
+        }.get(row['status'], '⏳')
+        
+        buttons.append([InlineKeyboardButton(
+            text=f"{status_emoji} {row['title']}", 
+            callback_data=f"review_post_{row['id']}"
+        )])
+        
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="review_section")]])
+    await send_or_edit_message(callback, "🧾 اختر المنشور الذي تريد مراجعته وتدقيقه:\n\n⏳ بانتظار المراجعة\n✅ معتمد\n❌ مرفوض\n📝 يحتاج تعديل", markup)
+
+@review_router.callback_query(F.data.startswith("review_post_"))
+async def review_post(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[2])
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        msg = review_post_text(post)
+
+        # تنبيه إن كان مراجع آخر يعمل على المنشور الآن
+        if post['claim_active'] and post['claimed_by'] != user_key(callback.from_user):
+            msg += f"\n\n🔒 <i>يراجعه الآن: @{post['claimed_by']} حتى {post['claimed_until'].strftime('%H:%M')}</i>"
+        
+        if post['photo_file_id']:
+            await callback.message.answer_photo(photo=post['photo_file_id'], caption=msg, reply_markup=review_post_kb(post_id))
         else:
-            await callback.answer("⛔️ المنشور غير موجود.", show_alert=True)
-
-    # معالجة أزرار المراجعة مع التأكيد
-    @dp.callback_query(F.data.startswith("approve_"))
-    async def ask_approve_confirmation(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[1])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            await send_or_edit_message(
-                callback,
-                f"✅ هل أنت متأكد من اعتماد هذا المنشور للنشر؟\n\n<b>{post['title']}</b>\n\nهذا القرار سيجعل المنشور متاحًا لجميع أعضاء الفريق في قسم المنشورات المراجعة.",
-                confirm_review_kb(post_id, 'approve'),
-                callback.message.photo is not None
-            )
-
-    @dp.callback_query(F.data.startswith("reject_"))
-    async def ask_reject_confirmation(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[1])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            await send_or_edit_message(
-                callback,
-                f"❌ هل أنت متأكد من رفض هذا المنشور؟\n\n<b>{post['title']}</b>\n\nهذا القرار سيحجب المنشور عن أعضاء الفريق العاديين.",
-                confirm_review_kb(post_id, 'reject'),
-                callback.message.photo is not None
-            )
-
-    @dp.callback_query(F.data.startswith("needs_edit_"))
-    async def ask_needs_edit_confirmation(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[2])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            await send_or_edit_message(
-                callback,
-                f"📝 هل أنت متأكد من تحديد أن هذا المنشور يحتاج تعديل؟\n\n<b>{post['title']}</b>\n\nسيُطلب منك كتابة ملاحظة توجيهية للكاتب.",
-                confirm_review_kb(post_id, 'needs_edit'),
-                callback.message.photo is not None
-            )
-
-    # تأكيد القرارات
-    @dp.callback_query(F.data.startswith("confirm_approve_"))
-    async def confirm_approve_post(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[2])
-        await update_post_review_status(pool, post_id, 'approved', callback.from_user.username)
-        await send_or_edit_message(callback, "✅ تم اعتماد المنشور بنجاح. جزاك الله خيرًا على هذا التدقيق المبارك.", main_menu_kb(True), callback.message.photo is not None)
-
-    @dp.callback_query(F.data.startswith("confirm_reject_"))
-    async def confirm_reject_post(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[2])
-        await update_post_review_status(pool, post_id, 'rejected', callback.from_user.username)
-        await send_or_edit_message(callback, "❌ تم رفض المنشور. جزاك الله خيرًا على حرصك على سلامة المحتوى.", main_menu_kb(True), callback.message.photo is not None)
-
-    @dp.callback_query(F.data.startswith("confirm_needs_edit_"))
-    async def confirm_needs_edit_post(callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[3])
-        await state.update_data(review_post_id=post_id)
-        await state.set_state(PostForm.waiting_for_review_note)
-        await send_or_edit_message(callback, "✒️ اكتب ملاحظتك المباركة على المنشور ليتم تعديله وفقًا لتوجيهك:", None, callback.message.photo is not None)
-
-    @dp.message(PostForm.waiting_for_review_note)
-    async def receive_review_note(message: Message, state: FSMContext):
-        data = await state.get_data()
-        post_id = data['review_post_id']
-        note = message.text
+            await send_or_edit_message(callback, msg, review_post_kb(post_id))
+    else:
+        await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
+
+# عرض معلومات المراجعة في رسالة منفصلة
+@review_router.callback_query(F.data.startswith("show_review_info_"))
+async def show_review_info(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ هذا القسم مخصص للمراجعين والمشايخ فقط", show_alert=True)
+        return
         
-        await update_post_review_status(pool, post_id, 'needs_edit', message.from_user.username, note)
-        await message.answer("📝 تم حفظ ملاحظتك المباركة. جزاك الله خيرًا على هذا التوجيه النافع.", reply_markup=main_menu_kb(True))
-        await state.clear()
-
-    # تعديل التصنيف - المعالج الأساسي
-    @dp.callback_query(F.data.startswith("change_status_"))
-    async def change_status_menu(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
+    post_id = int(callback.data.split("_")[3])
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        # تنسيق معلومات المراجعة للنسخ
+        info_msg = f"📋 <b>معلومات مراجعة المنشور #{post_id}</b>\n\n"
+        info_msg += f"📝 <b>العنوان:</b> {post['title']}\n\n"
+        
+        # حالة المنشور
+        status_text = {
+            'pending': '⏳ بانتظار المراجعة',
+            'approved': '✅ معتمد للنشر',
+            'rejected': '❌ مرفوض',
+            'needs_edit': '📝 يحتاج تعديل'
+        }.get(post['status'], 'غير محدد')
+        info_msg += f"🏷️ <b>الحالة:</b> {status_text}\n\n"
+        
+        # معلومات المراجع
+        if post['reviewed_by']:
+            info_msg += f"👤 <b>المراجع:</b> @{post['reviewed_by']}\n\n"
             
-        post_id = int(callback.data.split("_")[2])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            current_status = {
-                'pending': '⏳ بانتظار المراجعة',
-                'approved': '✅ معتمد للنشر',
-                'rejected': '❌ مرفوض',
-                'needs_edit': '📝 يحتاج تعديل'
-            }.get(post['status'], 'غير محدد')
+        if post['reviewed_at']:
+            review_date = post['reviewed_at'].strftime("%Y-%m-%d %H:%M")
+            info_msg += f"📅 <b>تاريخ المراجعة:</b> {review_date}\n\n"
             
-            await send_or_edit_message(
-                callback,
-                f"🔄 تعديل تصنيف المنشور:\n\n<b>{post['title']}</b>\n\nالتصنيف الحالي: {current_status}\n\nاختر التصنيف الجديد:",
-                change_status_kb(post_id),
-                callback.message.photo is not None
-            )
-
-    # معالجات تعديل التصنيف المباشر
-    @dp.callback_query(F.data.startswith("set_status_pending_"))
-    async def set_status_pending(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
+        # ملاحظة المراجع
+        if post['review_note']:
+            info_msg += f"📝 <b>ملاحظة المراجع:</b>\n{post['review_note']}\n\n"
             
-        post_id = int(callback.data.split("_")[3])
-        await update_post_review_status(pool, post_id, 'pending', callback.from_user.username)
+        # معلومات الكاتب الأصلي
+        info_msg += f"👤 <b>كاتب المنشور:</b> @{post['username']}\n"
+        
+        if post['created_at']:
+            created_date = post['created_at'].strftime("%Y-%m-%d %H:%M")
+            info_msg += f"📅 <b>تاريخ الإنشاء:</b> {created_date}"
         
+        # إرسال الرسالة المنفصلة
+        await callback.message.answer(info_msg, reply_markup=InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")]]
+        ))
+    else:
+        await callback.answer("⛔️ المنشور غير موجود.", show_alert=True)
+
+# معالجة أزرار المراجعة مع التأكيد
+@review_router.callback_query(F.data.startswith("approve_"))
+async def ask_approve_confirmation(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[1])
+    post = await get_post_by_id(pool, post_id)
+    if post:
         await send_or_edit_message(
             callback,
-            f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ⏳ بانتظار المراجعة\n\nبارك الله فيك على هذا التدقيق المبارك.",
-            InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
-                [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
-            ]),
+            f"✅ هل أنت متأكد من اعتماد هذا المنشور للنشر؟\n\n<b>{post['title']}</b>\n\nهذا القرار سيجعل المنشور متاحًا لجميع أعضاء الفريق في قسم المنشورات المراجعة.",
+            confirm_review_kb(post_id, 'approve'),
             callback.message.photo is not None
         )
 
-    @dp.callback_query(F.data.startswith("set_status_approved_"))
-    async def set_status_approved(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[3])
-        await update_post_review_status(pool, post_id, 'approved', callback.from_user.username)
+@review_router.callback_query(F.data.startswith("reject_"))
+async def ask_reject_confirmation(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
         
+    post_id = int(callback.data.split("_")[1])
+    post = await get_post_by_id(pool, post_id)
+    if post:
         await send_or_edit_message(
             callback,
-            f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ✅ معتمد للنشر\n\nبارك الله فيك على هذا التدقيق المبارك.",
-            InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
-                [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
-            ]),
+            f"❌ هل أنت متأكد من رفض هذا المنشور؟\n\n<b>{post['title']}</b>\n\nهذا القرار سيحجب المنشور عن أعضاء الفريق العاديين.",
+            confirm_review_kb(post_id, 'reject'),
             callback.message.photo is not None
         )
 
-    @dp.callback_query(F.data.startswith("set_status_rejected_"))
-    async def set_status_rejected(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[3])
-        await update_post_review_status(pool, post_id, 'rejected', callback.from_user.username)
+@review_router.callback_query(F.data.startswith("needs_edit_"))
+async def ask_needs_edit_confirmation(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
         
+    post_id = int(callback.data.split("_")[2])
+    post = await get_post_by_id(pool, post_id)
+    if post:
         await send_or_edit_message(
             callback,
-            f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ❌ مرفوض\n\nبارك الله فيك على هذا التدقيق المبارك.",
-            InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
-                [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
-            ]),
+            f"📝 هل أنت متأكد من تحديد أن هذا المنشور يحتاج تعديل؟\n\n<b>{post['title']}</b>\n\nسيُطلب منك كتابة ملاحظة توجيهية للكاتب.",
+            confirm_review_kb(post_id, 'needs_edit'),
             callback.message.photo is not None
         )
 
-    @dp.callback_query(F.data.startswith("set_status_needs_edit_"))
-    async def set_status_needs_edit(callback: CallbackQuery):
-        if callback.from_user.username not in REVIEWERS:
-            await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
-            return
-            
-        post_id = int(callback.data.split("_")[4])
-        await update_post_review_status(pool, post_id, 'needs_edit', callback.from_user.username)
+# تأكيد القرارات
+@review_router.callback_query(F.data.startswith("confirm_approve_"))
+async def confirm_approve_post(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[2])
+    await update_post_review_status(pool, post_id, 'approved', user_key(callback.from_user))
+    await send_or_edit_message(callback, "✅ تم اعتماد المنشور بنجاح. جزاك الله خيرًا على هذا التدقيق المبارك.", main_menu_kb(True), callback.message.photo is not None)
+
+@review_router.callback_query(F.data.startswith("confirm_reject_"))
+async def confirm_reject_post(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[2])
+    await update_post_review_status(pool, post_id, 'rejected', user_key(callback.from_user))
+    await send_or_edit_message(callback, "❌ تم رفض المنشور. جزاك الله خيرًا على حرصك على سلامة المحتوى.", main_menu_kb(True), callback.message.photo is not None)
+
+@review_router.callback_query(F.data.startswith("confirm_needs_edit_"))
+async def confirm_needs_edit_post(callback: CallbackQuery, state: FSMContext):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[3])
+    await state.update_data(review_post_id=post_id)
+    await state.set_state(PostForm.waiting_for_review_note)
+    await send_or_edit_message(callback, "✒️ اكتب ملاحظتك المباركة على المنشور ليتم تعديله وفقًا لتوجيهك:", None, callback.message.photo is not None)
+
+@review_router.message(PostForm.waiting_for_review_note)
+async def receive_review_note(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    post_id = data['review_post_id']
+    note = message.text
+    
+    await update_post_review_status(pool, post_id, 'needs_edit', user_key(message.from_user), note)
+    await message.answer("📝 تم حفظ ملاحظتك المباركة. جزاك الله خيرًا على هذا التوجيه النافع.", reply_markup=main_menu_kb(True))
+    await state.clear()
+
+# تعديل التصنيف - المعالج الأساسي
+@review_router.callback_query(F.data.startswith("change_status_"))
+async def change_status_menu(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[2])
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        current_status = {
+            'pending': '⏳ بانتظار المراجعة',
+            'approved': '✅ معتمد للنشر',
+            'rejected': '❌ مرفوض',
+            'needs_edit': '📝 يحتاج تعديل'
+        }.get(post['status'], 'غير محدد')
         
         await send_or_edit_message(
             callback,
-            f"✅ تم تعديل تصنيف المنشور بنجاح إلى: 📝 يحتاج تعديل\n\nبارك الله فيك على هذا التدقيق المبارك.",
-            InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
-                [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
-            ]),
+            f"🔄 تعديل تصنيف المنشور:\n\n<b>{post['title']}</b>\n\nالتصنيف الحالي: {current_status}\n\nاختر التصنيف الجديد:",
+            change_status_kb(post_id),
             callback.message.photo is not None
         )
 
-    @dp.callback_query(F.data == "edit")
-    async def handle_edit(callback: CallbackQuery, state: FSMContext):
-        posts = await get_all_posts(pool)
-        if not posts:
-            await send_or_edit_message(callback, "❌ لا توجد منشورات للتعديل.", back_to_main_kb())
-            return
-        buttons = []
-        for row in posts:
-            status_emoji = {
-                'pending': '⏳',
-                'approved': '✅',
-                'rejected': '❌',
-                'needs_edit': '📝'
-            }.get(row['status'], '⏳')
-            buttons.append([InlineKeyboardButton(text=f"{status_emoji} {row['title']}", callback_data=f"select_edit_{row['id']}")])
-        markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]])
-        await send_or_edit_message(callback, "✏️ اختر المنشور الذي تريد تعديله:", markup)
-
-    @dp.callback_query(F.data.startswith("select_edit_"))
-    async def select_edit_post(callback: CallbackQuery, state: FSMContext):
-        post_id = int(callback.data.split("_")[2])
-        await state.update_data(edit_post_id=post_id)
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            msg = f"تعديل المنشور: <b>{post['title']}</b>\n\nاختر ما تريد تعديله:"
-            if post['status'] == 'needs_edit' and post['review_note']:
-                msg += f"\n\n📝 <i>ملاحظة المراجع:</i>\n{post['review_note']}"
-            await send_or_edit_message(callback, msg, edit_post_fields_kb())
-        else:
-            await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
-
-    @dp.callback_query(F.data == "edit_title")
-    async def edit_title(callback: CallbackQuery, state: FSMContext):
-        await state.set_state(PostForm.waiting_for_edit_value)
-        await state.update_data(edit_field="title")
-        await send_or_edit_message(callback, "📝 أرسل العنوان الجديد:")
-
-    @dp.callback_query(F.data == "edit_text")
-    async def edit_text(callback: CallbackQuery, state: FSMContext):
-        await state.set_state(PostForm.waiting_for_edit_value)
-        await state.update_data(edit_field="text")
-        await send_or_edit_message(callback, "📄 أرسل النص الجديد:")
-
-    @dp.callback_query(F.data == "change_photo")
-    async def change_photo(callback: CallbackQuery, state: FSMContext):
-        await state.set_state(PostForm.waiting_for_new_photo)
-        await send_or_edit_message(callback, "📤 أرسل الصورة الجديدة:")
-
-    @dp.message(PostForm.waiting_for_new_photo, F.photo)
-    async def receive_new_photo(message: Message, state: FSMContext):
-        data = await state.get_data()
-        post_id = data['edit_post_id']
-        new_photo_file_id = message.photo[-1].file_id
+# معالجات تعديل التصنيف المباشر
+@review_router.callback_query(F.data.startswith("set_status_pending_"))
+async def set_status_pending(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+        
+    post_id = int(callback.data.split("_")[3])
+    await update_post_review_status(pool, post_id, 'pending', user_key(callback.from_user))
+    
+    await send_or_edit_message(
+        callback,
+        f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ⏳ بانتظار المراجعة\n\nبارك الله فيك على هذا التدقيق المبارك.",
+        InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
+            [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
+        ]),
+        callback.message.photo is not None
+    )
+
+@review_router.callback_query(F.data.startswith("set_status_approved_"))
+async def set_status_approved(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
         
-        await update_post(pool, post_id, "photo_file_id", new_photo_file_id)
-        # إعادة تعيين حالة المنشور إلى pending بعد التعديل
-        await update_post(pool, post_id, "status", "pending")
-        await message.answer("✅ تم تغيير الصورة بنجاح وأُعيد المنشور لانتظار المراجعة. بارك الله فيك.", reply_markup=main_menu_kb(message.from_user.username in REVIEWERS))
-        await state.clear()
-
-    @dp.callback_query(F.data == "remove_photo")
-    async def remove_photo(callback: CallbackQuery, state: FSMContext):
-        data = await state.get_data()
-        post_id = data['edit_post_id']
+    post_id = int(callback.data.split("_")[3])
+    await update_post_review_status(pool, post_id, 'approved', user_key(callback.from_user))
+    
+    await send_or_edit_message(
+        callback,
+        f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ✅ معتمد للنشر\n\nبارك الله فيك على هذا التدقيق المبارك.",
+        InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
+            [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
+        ]),
+        callback.message.photo is not None
+    )
+
+@review_router.callback_query(F.data.startswith("set_status_rejected_"))
+async def set_status_rejected(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
         
-        await update_post(pool, post_id, "photo_file_id", None)
-        # إعادة تعيين حالة المنشور إلى pending بعد التعديل
-        await update_post(pool, post_id, "status", "pending")
-        await send_or_edit_message(callback, "✅ تم حذف الصورة بنجاح وأُعيد المنشور لانتظار المراجعة. بارك الله فيك.", main_menu_kb(callback.from_user.username in REVIEWERS))
-        await state.clear()
-
-    @dp.message(PostForm.waiting_for_edit_value)
-    async def receive_edit_value(message: Message, state: FSMContext):
-        data = await state.get_data()
-        post_id = data['edit_post_id']
-        field = data['edit_field']
-        new_value = message.text
+    post_id = int(callback.data.split("_")[3])
+    await update_post_review_status(pool, post_id, 'rejected', user_key(callback.from_user))
+    
+    await send_or_edit_message(
+        callback,
+        f"✅ تم تعديل تصنيف المنشور بنجاح إلى: ❌ مرفوض\n\nبارك الله فيك على هذا التدقيق المبارك.",
+        InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
+            [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
+        ]),
+        callback.message.photo is not None
+    )
+
+@review_router.callback_query(F.data.startswith("set_status_needs_edit_"))
+async def set_status_needs_edit(callback: CallbackQuery, pool: asyncpg.Pool):
+    if not user_is_reviewer(callback.from_user):
+        await callback.answer("❌ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
         
-        await update_post(pool, post_id, field, new_value)
-        # إعادة تعيين حالة المنشور إلى pending بعد التعديل
-        await update_post(pool, post_id, "status", "pending")
-        await message.answer("✅ تم تعديل المنشور بنجاح وأُعيد لانتظار المراجعة. بارك الله فيك.", reply_markup=main_menu_kb(message.from_user.username in REVIEWERS))
-        await state.clear()
-
-    @dp.callback_query(F.data == "delete")
-    async def handle_delete(callback: CallbackQuery, state: FSMContext):
-        posts = await get_all_posts(pool)
-        if not posts:
-            await send_or_edit_message(callback, "❌ لا توجد منشورات لحذفها.", back_to_main_kb())
-            return
-        buttons = []
-        for row in posts:
-            status_emoji = {
-                'pending': '⏳',
-                'approved': '✅',
-                'rejected': '❌',
-                'needs_edit': '📝'
-            }.get(row['status'], '⏳')
-            buttons.append([InlineKeyboardButton(text=f"{status_emoji} {row['title']}", callback_data=f"ask_delete_{row['id']}")])
-        markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]])
-        await send_or_edit_message(callback, "🗑️ اختر المنشور الذي تريد حذفه:", markup)
-
-    @dp.callback_query(F.data.startswith("ask_delete_"))
-    async def ask_delete(callback: CallbackQuery):
-        post_id = int(callback.data.split("_")[2])
-        post = await get_post_by_id(pool, post_id)
-        if post:
-            msg = f"⚠️ هل أنت متأكد أنك تريد حذف المنشور التالي؟\n\n<b>{post['title']}</b>"
-            await send_or_edit_message(callback, msg, confirm_delete_kb(post_id))
-        else:
-            await callback.message.answer("⛔️ المنشور غير موجود.")
-
-    @dp.callback_query(F.data.startswith("confirm_delete_"))
-    async def confirm_delete(callback: CallbackQuery):
-        post_id = int(callback.data.split("_")[2])
-        await delete_post(pool, post_id)
-        await send_or_edit_message(callback, "🗑️ تم حذف المنشور بنجاح. نسأل الله الإخلاص والقبول.", main_menu_kb(callback.from_user.username in REVIEWERS))
-
-    # معالج الرجوع الرئيسي
-    @dp.callback_query(F.data == "back_to_main")
-    async def go_back_to_main(callback: CallbackQuery, state: FSMContext):
-        await state.clear()
-        is_reviewer = callback.from_user.username in REVIEWERS
-        await send_or_edit_message(callback, "🔙 رجعناك للقائمة الرئيسية جزاك الله خيرا 🌿", main_menu_kb(is_reviewer))
-
-    # معالج الرجوع القديم للتوافق
-    @dp.callback_query(F.data == "back")
-    async def go_back(callback: CallbackQuery, state: FSMContext):
-        await state.clear()
-        is_reviewer = callback.from_user.username in REVIEWERS
-        await send_or_edit_message(callback, "🔙 رجعناك للقائمة الرئيسية جزاك الله خيرا 🌿", main_menu_kb(is_reviewer))
+    post_id = int(callback.data.split("_")[4])
+    await update_post_review_status(pool, post_id, 'needs_edit', user_key(callback.from_user))
+    
+    await send_or_edit_message(
+        callback,
+        f"✅ تم تعديل تصنيف المنشور بنجاح إلى: 📝 يحتاج تعديل\n\nبارك الله فيك على هذا التدقيق المبارك.",
+        InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 رجوع للمنشور", callback_data=f"review_post_{post_id}")],
+            [InlineKeyboardButton(text="🏠 القائمة الرئيسية", callback_data="back_to_main")]
+        ]),
+        callback.message.photo is not None
+    )
+
+@posts_router.callback_query(F.data == "edit")
+async def handle_edit(callback: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    posts = await get_all_posts(pool)
+    if not posts:
+        await send_or_edit_message(callback, "❌ لا توجد منشورات للتعديل.", back_to_main_kb())
+        return
+    buttons = []
+    for row in posts:
+        status_emoji = {
+            'pending': '⏳',
+            'approved': '✅',
+            'rejected': '❌',
+            'needs_edit': '📝'
+        }.get(row['status'], '⏳')
+        buttons.append([InlineKeyboardButton(text=f"{status_emoji} {row['title']}", callback_data=f"select_edit_{row['id']}")])
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]])
+    await send_or_edit_message(callback, "✏️ اختر المنشور الذي تريد تعديله:", markup)
+
+@posts_router.callback_query(F.data.startswith("select_edit_"))
+async def select_edit_post(callback: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    post_id = int(callback.data.split("_")[2])
+    await state.update_data(edit_post_id=post_id)
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        msg = f"تعديل المنشور: <b>{post['title']}</b>\n\nاختر ما تريد تعديله:"
+        if post['status'] == 'needs_edit' and post['review_note']:
+            msg += f"\n\n📝 <i>ملاحظة المراجع:</i>\n{post['review_note']}"
+        await send_or_edit_message(callback, msg, edit_post_fields_kb())
+    else:
+        await send_or_edit_message(callback, "⛔️ المنشور غير موجود.", back_to_main_kb())
+
+@posts_router.callback_query(F.data == "edit_title")
+async def edit_title(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(PostForm.waiting_for_edit_value)
+    await state.update_data(edit_field="title")
+    await send_or_edit_message(callback, "📝 أرسل العنوان الجديد:")
+
+@posts_router.callback_query(F.data == "edit_text")
+async def edit_text(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(PostForm.waiting_for_edit_value)
+    await state.update_data(edit_field="text")
+    await send_or_edit_message(callback, "📄 أرسل النص الجديد:")
+
+@posts_router.callback_query(F.data == "change_photo")
+async def change_photo(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(PostForm.waiting_for_new_photo)
+    await send_or_edit_message(callback, "📤 أرسل الصورة الجديدة:")
+
+@posts_router.message(PostForm.waiting_for_new_photo, F.photo)
+async def receive_new_photo(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    post_id = data['edit_post_id']
+    new_photo_file_id = message.photo[-1].file_id
+    
+    await update_post(pool, post_id, "photo_file_id", new_photo_file_id)
+    # إعادة تعيين حالة المنشور إلى pending بعد التعديل
+    await update_post(pool, post_id, "status", "pending")
+    await message.answer("✅ تم تغيير الصورة بنجاح وأُعيد المنشور لانتظار المراجعة. بارك الله فيك.", reply_markup=main_menu_kb(user_is_reviewer(message.from_user)))
+    await state.clear()
+
+@posts_router.callback_query(F.data == "remove_photo")
+async def remove_photo(callback: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    post_id = data['edit_post_id']
+    
+    await update_post(pool, post_id, "photo_file_id", None)
+    # إعادة تعيين حالة المنشور إلى pending بعد التعديل
+    await update_post(pool, post_id, "status", "pending")
+    await send_or_edit_message(callback, "✅ تم حذف الصورة بنجاح وأُعيد المنشور لانتظار المراجعة. بارك الله فيك.", main_menu_kb(user_is_reviewer(callback.from_user)))
+    await state.clear()
+
+@posts_router.message(PostForm.waiting_for_edit_value)
+async def receive_edit_value(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    post_id = data['edit_post_id']
+    field = data['edit_field']
+    new_value = message.text
+    
+    await update_post(pool, post_id, field, new_value)
+    # إعادة تعيين حالة المنشور إلى pending بعد التعديل
+    await update_post(pool, post_id, "status", "pending")
+    await message.answer("✅ تم تعديل المنشور بنجاح وأُعيد لانتظار المراجعة. بارك الله فيك.", reply_markup=main_menu_kb(user_is_reviewer(message.from_user)))
+    await state.clear()
+
+@posts_router.callback_query(F.data == "delete")
+async def handle_delete(callback: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    posts = await get_all_posts(pool)
+    if not posts:
+        await send_or_edit_message(callback, "❌ لا توجد منشورات لحذفها.", back_to_main_kb())
+        return
+    buttons = []
+    for row in posts:
+        status_emoji = {
+            'pending': '⏳',
+            'approved': '✅',
+            'rejected': '❌',
+            'needs_edit': '📝'
+        }.get(row['status'], '⏳')
+        buttons.append([InlineKeyboardButton(text=f"{status_emoji} {row['title']}", callback_data=f"ask_delete_{row['id']}")])
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons + [[InlineKeyboardButton(text="🔙 رجوع", callback_data="back_to_main")]])
+    await send_or_edit_message(callback, "🗑️ اختر المنشور الذي تريد حذفه:", markup)
+
+@posts_router.callback_query(F.data.startswith("ask_delete_"))
+async def ask_delete(callback: CallbackQuery, pool: asyncpg.Pool):
+    post_id = int(callback.data.split("_")[2])
+    post = await get_post_by_id(pool, post_id)
+    if post:
+        msg = f"⚠️ هل أنت متأكد أنك تريد حذف المنشور التالي؟\n\n<b>{post['title']}</b>"
+        await send_or_edit_message(callback, msg, confirm_delete_kb(post_id))
+    else:
+        await callback.message.answer("⛔️ المنشور غير موجود.")
+
+@posts_router.callback_query(F.data.startswith("confirm_delete_"))
+async def confirm_delete(callback: CallbackQuery, pool: asyncpg.Pool):
+    post_id = int(callback.data.split("_")[2])
+    await delete_post(pool, post_id)
+    await send_or_edit_message(callback, "🗑️ تم حذف المنشور بنجاح. نسأل الله الإخلاص والقبول.", main_menu_kb(user_is_reviewer(callback.from_user)))
+
+# معالج الرجوع الرئيسي
+@main_router.callback_query(F.data == "back_to_main")
+async def go_back_to_main(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    is_reviewer = user_is_reviewer(callback.from_user)
+    await send_or_edit_message(callback, "🔙 رجعناك للقائمة الرئيسية جزاك الله خيرا 🌿", main_menu_kb(is_reviewer))
+
+# معالج الرجوع القديم للتوافق
+@main_router.callback_query(F.data == "back")
+async def go_back(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    is_reviewer = user_is_reviewer(callback.from_user)
+    await send_or_edit_message(callback, "🔙 رجعناك للقائمة الرئيسية جزاك الله خيرا 🌿", main_menu_kb(is_reviewer))
+
+def build_dispatcher(pool, rate_limit_scale=1.0, **workflow_data):
+    """بناء الموزّع وربط الموجّهات به؛ الموجّهات تُربط بموزّع واحد فقط لكل عملية
+
+    rate_limit_scale يقسم نوافذ تحديد المعدل (إعادة التشغيل بسرعة 10x تستخدم 10)، و None يعطل الحدود
+    مع إبقاء فحص الصلاحيات.
+    """
+    reports = ReportEngine(
+        pool,
+        stale_days=REPORT_STALE_DAYS,
+        window_days=REPORT_WINDOW_DAYS,
+        cache_minutes=REPORT_CACHE_MINUTES,
+        schedule=REPORT_SCHEDULE,
+        chat_ids=REPORT_CHAT_IDS,
+    )
+    if rate_limit_scale is None:
+        access = AccessMiddleware(user_is_allowed)
+    else:
+        access = AccessMiddleware(
+            user_is_allowed,
+            per_user=scale_rate(RATE_LIMIT_PER_USER, rate_limit_scale),
+            per_action=scale_rate(RATE_LIMIT_PER_ACTION, rate_limit_scale),
+            max_in_flight=MAX_IN_FLIGHT_PER_USER,
+        )
+    dp = Dispatcher(storage=MemoryStorage(), pool=pool, reports=reports, access=access, **workflow_data)
+    # على مستوى الرسائل والأزرار حتى يرى المسجّل والمتتبع الطلبات المرفوضة أيضًا
+    dp.message.outer_middleware(access)
+    dp.callback_query.outer_middleware(access)
+    dp.include_routers(main_router, posts_router, review_router)
+    return dp
+
+async def on_startup(bot: Bot, started_at: float, reports: ReportEngine):
+    # تقرير المراجعين يعمل في مهمة خلفية واحدة لا تعطل معالجة التحديثات
+    reports.start(bot)
+    mark_ready(READY_FILE)
+    me = await bot.me()
+    logger.info("Bot @%s ready in %.0f ms", me.username, (time.perf_counter() - started_at) * 1000)
+
+async def on_shutdown(dispatcher: Dispatcher, pool: asyncpg.Pool, in_flight: InFlightMiddleware, reports: ReportEngine):
+    """بعد توقف الاستقبال: انتظار المعالجات الجارية ثم إغلاق التخزين وقاعدة البيانات (الجلسة يغلقها aiogram)"""
+    mark_not_ready(READY_FILE)
+    started = time.perf_counter()
+    # مهلة واحدة للإيقاف كله: إغلاق قاعدة البيانات يأخذ ما تبقى بعد التصريف فقط
+    deadline = started + SHUTDOWN_DRAIN_SECONDS
+    await reports.stop()
+
+    remaining = await in_flight.drain(max(0, deadline - time.perf_counter()))
+    if remaining:
+        logger.warning("Drain deadline reached with %d updates still in flight", remaining)
+
+    await dispatcher.storage.close()
+    try:
+        await asyncio.wait_for(pool.close(), max(0, deadline - time.perf_counter()))
+    except asyncio.TimeoutError:
+        pool.terminate()
+
+    logger.info("Drained and closed in %.0f ms", (time.perf_counter() - started) * 1000)
+
+async def main():
+    started_at = time.perf_counter()
+
+    # بدون مفتاح سري تُعكس الأسماء المستعارة بتجربة المعرفات وأسماء المستخدمين المعروفة
+    if RECORD_UPDATES_PATH and not RECORD_SALT:
+        raise RuntimeError("RECORD_UPDATES_PATH requires a non-empty secret RECORD_SALT")
+
+    # تسجيل التحديثات الحقيقية (مع إخفاء البيانات الشخصية) لإعادة تشغيلها لاحقًا عبر replay.py
+    session = RecordingSession() if RECORD_UPDATES_PATH else AiohttpSession()
+    bot = Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+    # تهيئة قاعدة البيانات والتحقق من التوكن بالتوازي (bot.me يُخزَّن فلا يعيده الاستقبال)
+    pool, me = await asyncio.gather(warm_up_database(), bot.me(), return_exceptions=True)
+    if isinstance(pool, BaseException) or isinstance(me, BaseException):
+        if not isinstance(pool, BaseException):
+            await pool.close()
+        await bot.session.close()
+        raise pool if isinstance(pool, BaseException) else me
+    logger.info("Database and Bot API warm-up took %.0f ms", (time.perf_counter() - started_at) * 1000)
+
+    in_flight = InFlightMiddleware()
+    dp = build_dispatcher(pool, in_flight=in_flight, started_at=started_at)
+    dp.update.outer_middleware(in_flight)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    if RECORD_UPDATES_PATH:
+        recorder = install_recorder(dp, RECORD_UPDATES_PATH, RECORD_SALT)
+        dp.shutdown.register(recorder.close)
 
     await dp.start_polling(bot)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())